@@ -0,0 +1,120 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+"""Configuration file, in TOML, with one table per network::
+
+    [networks.libera]
+    hostname = "irc.libera.chat"
+    port = 6697  # optional
+    tls = true  # optional
+    nicks = ["mynick", "mynick_"]  # the others are used if the first is taken
+    autojoin = ["#channel", "#other-channel key"]
+
+    [networks.libera.sasl]  # optional
+    username = "mynick"
+    password = "hunter2"
+"""
+
+from __future__ import annotations
+
+import dataclasses
+
+
+class ConfigError(ValueError):
+    pass
+
+
+@dataclasses.dataclass
+class SaslConfig:
+    username: str
+    password: str
+
+
+@dataclasses.dataclass
+class NetworkConfig:
+    hostname: str
+    nicks: list[str]
+    port: int = 6697
+    tls: bool = True
+    sasl: SaslConfig | None = None
+    autojoin: list[tuple[str, str | None]] = dataclasses.field(default_factory=list)
+    """Channels to join after connecting, and their key"""
+
+
+def _get(table: dict, key: str, type_: type, path: str):
+    value = table[key]
+    if not isinstance(value, type_):
+        raise ConfigError(f"{path}.{key} should be a {type_.__name__}")
+    return value
+
+
+def _parse_network(name: str, table: dict) -> NetworkConfig:
+    path = f"networks.{name}"
+    try:
+        nicks = _get(table, "nicks", list, path)
+        if not nicks or not all(isinstance(nick, str) for nick in nicks):
+            raise ConfigError(f"{path}.nicks should be a non-empty list of strings")
+
+        autojoin = []
+        for channel in table.get("autojoin", []):
+            if not isinstance(channel, str) or not channel.strip():
+                raise ConfigError(f"{path}.autojoin should be a list of channels")
+            (channel, *key) = channel.split()
+            autojoin.append((channel, key[0] if key else None))
+
+        if "sasl" in table:
+            sasl_table = _get(table, "sasl", dict, path)
+            sasl = SaslConfig(
+                username=_get(sasl_table, "username", str, f"{path}.sasl"),
+                password=_get(sasl_table, "password", str, f"{path}.sasl"),
+            )
+        else:
+            sasl = None
+
+        return NetworkConfig(
+            hostname=_get(table, "hostname", str, path),
+            port=_get(table, "port", int, path) if "port" in table else 6697,
+            tls=_get(table, "tls", bool, path) if "tls" in table else True,
+            nicks=nicks,
+            sasl=sasl,
+            autojoin=autojoin,
+        )
+    except KeyError as e:
+        raise ConfigError(f"Missing {path}.{e.args[0]}") from None
+
+
+def load_network(path: str, name: str) -> NetworkConfig:
+    # Only needed for configuration files, which are optional
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ConfigError("Configuration files require Python 3.11 or tomli")
+
+    try:
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise ConfigError(f"Could not read {path}: {e}") from None
+
+    networks = config.get("networks", {})
+    if name not in networks:
+        raise ConfigError(
+            f"No network {name!r} in {path}, expected one of: {', '.join(networks)}"
+        )
+    return _parse_network(name, networks[name])
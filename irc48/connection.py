@@ -16,13 +16,22 @@
 
 from __future__ import annotations
 
+import collections
 import io
 import socket
 import ssl
+import threading
+import time
 
 from .state import State
 from . import message
 
+FLOOD_BURST = 5
+"""Number of paced messages that can be sent at once"""
+
+FLOOD_INTERVAL = 0.5
+"""Seconds between two paced messages, after the burst"""
+
 
 class Connection:
     _raw_socket: socket.socket
@@ -44,8 +53,34 @@ class Connection:
 
         self._buffer = b""
 
+        self._send_lock = threading.Lock()
+        self._paced_messages: collections.deque[message.Message] = collections.deque()
+        self._flood_tokens = float(FLOOD_BURST)
+        self._flood_time = time.monotonic()
+
+    @property
+    def local_address(self) -> str:
+        """Address of this end of the connection, to advertise in DCC requests"""
+        return self._raw_socket.getsockname()[0]
+
     def send_message(self, message: message.Message) -> None:
-        self._socket.sendall(message.to_bytes())
+        with self._send_lock:
+            self._socket.sendall(message.to_bytes())
+
+    def send_paced_message(self, message: message.Message) -> None:
+        """Sends the message from the connection thread, as soon as flood
+        control allows it."""
+        self._paced_messages.append(message)
+
+    def _send_paced_messages(self) -> None:
+        now = time.monotonic()
+        self._flood_tokens = min(
+            FLOOD_BURST, self._flood_tokens + (now - self._flood_time) / FLOOD_INTERVAL
+        )
+        self._flood_time = now
+        while self._paced_messages and self._flood_tokens >= 1:
+            self._flood_tokens -= 1
+            self.send_message(self._paced_messages.popleft())
 
     def get_message(self) -> message.Message:
         """Blocking"""
@@ -69,6 +104,7 @@ class Connection:
 
     def loop(self, state: State) -> None:
         while not state.shut_down:
+            self._send_paced_messages()
             try:
                 msg = self.get_message()
             except socket.timeout:
@@ -0,0 +1,262 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+"""Runs the IRC core without a terminal, and lets frontends attach to it
+over a Unix socket.
+
+The protocol is one JSON object per line. Messages are encoded as
+``[author, content, prefix, action]`` lists.
+
+Daemon to frontend:
+
+* ``{"type": "attach", "current_buffer": ..., "buffers": [...]}``, sent once
+  when the frontend connects; each buffer is
+  ``{"name": ..., "unread": ..., "end": ..., "lines": [...]}``, where ``end``
+  is the sequence number after the last line
+* ``{"type": "message", "message": ..., "buffer": ...}``; ``buffer`` is
+  omitted for messages that are not part of a buffer, like errors
+* ``{"type": "switch", "buffer": ..., "end": ..., "lines": [...]}``
+* ``{"type": "scrollback", "buffer": ..., "start": ..., "lines": [...]}``
+
+Frontend to daemon:
+
+* ``{"type": "input", "line": ...}``
+* ``{"type": "scrollback", "buffer": ..., "start": ..., "end": ...}``, to get
+  the lines with sequence numbers in ``[start, end)``
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import queue
+import socket
+import stat
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    from .state import State, BufferMessage, BufferSnapshot, StateSnapshot
+
+ATTACH_LINES = 50
+"""Number of lines of each buffer sent to frontends when they attach"""
+
+SEND_QUEUE_SIZE = 1000
+"""Number of messages waiting to be sent to a frontend before it is considered
+stuck, and disconnected"""
+
+
+class DaemonError(Exception):
+    pass
+
+
+def encode_messages(msgs: typing.Iterable[BufferMessage]) -> list[list]:
+    return [dataclasses.astuple(msg) for msg in msgs]
+
+
+def decode_messages(msgs: list[list]) -> list[BufferMessage]:
+    from .state import BufferMessage
+
+    return [BufferMessage(*msg) for msg in msgs]
+
+
+class _Client:
+    def __init__(self, sock: socket.socket):
+        self._socket = sock
+        self._send_queue: queue.Queue[bytes] = queue.Queue(SEND_QUEUE_SIZE)
+        self.closed = False
+
+    def send(self, obj: dict) -> None:
+        data = json.dumps(obj, separators=(",", ":")).encode() + b"\n"
+        try:
+            self._send_queue.put_nowait(data)
+        except queue.Full:
+            # Not reading (eg. suspended terminal); also unblocks loop_send
+            self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def loop_send(self) -> None:
+        while not self.closed:
+            try:
+                data = self._send_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self._socket.sendall(data)
+            except OSError:
+                self.close()
+        self._socket.close()
+
+    def loop_receive(self, state: State) -> None:
+        try:
+            with self._socket.makefile("rb") as f:
+                for line in f:
+                    if self.closed:
+                        break
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(request, dict):
+                        self._handle_request(state, request)
+        except OSError:
+            pass  # frontend went away
+        finally:
+            self.close()
+
+    def _handle_request(self, state: State, request: dict) -> None:
+        """Ignores invalid requests"""
+        if request.get("type") == "input":
+            if isinstance(request.get("line"), str):
+                state.on_user_input(request["line"])
+        elif request.get("type") == "scrollback":
+            buf_name = request.get("buffer")
+            (start, end) = (request.get("start"), request.get("end"))
+            if (
+                (buf_name is None or isinstance(buf_name, str))
+                and type(start) is int
+                and type(end) is int
+            ):
+                self._send_scrollback(state, buf_name, start, end)
+
+    def _send_scrollback(
+        self, state: State, buf_name: str | None, start: int, end: int
+    ) -> None:
+        # Buffers are only ever appended to by the State thread, so this reads
+        # a snapshot instead of going through the event queue.
+        buf = state.messages.get(buf_name)
+        if buf is None:
+            return
+        snapshot = buf.snapshot()
+        start = max(start, snapshot.start)
+        self.send(
+            {
+                "type": "scrollback",
+                "buffer": buf_name,
+                "start": start,
+                "lines": encode_messages(snapshot.window(start, end)),
+            }
+        )
+
+
+class Daemon:
+    """Stands in for :class:`irc48.ui.UI` in the daemon, forwarding what
+    would be displayed to all attached frontends.
+
+    ``display_message`` and ``switch_to_buffer`` are called by the State
+    thread, which is also the only one to modify the list of clients."""
+
+    def __init__(self, state: State, path: str):
+        self._state = state
+        self._path = path
+        self._clients: list[_Client] = []
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def start(self) -> None:
+        if os.path.lexists(self._path):
+            self._remove_stale_socket()
+        old_umask = os.umask(0o077)  # only the current user may attach
+        try:
+            self._socket.bind(self._path)
+        finally:
+            os.umask(old_umask)
+        self._socket.listen()
+        self._socket.settimeout(0.1)  # want to exit the thread early when requested
+
+    def _remove_stale_socket(self) -> None:
+        """Removes the socket left over by a daemon that is no longer running,
+        and refuses to remove anything else."""
+        if not stat.S_ISSOCK(os.lstat(self._path).st_mode):
+            raise DaemonError(f"{self._path} already exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._path)
+        except ConnectionRefusedError:
+            os.unlink(self._path)
+        else:
+            raise DaemonError(f"A daemon is already running on {self._path}")
+        finally:
+            probe.close()
+
+    def loop_accept(self) -> None:
+        while not self._state.shut_down:
+            try:
+                (sock, _) = self._socket.accept()
+            except socket.timeout:
+                continue
+            sock.settimeout(None)
+            client = _Client(sock)
+            threading.Thread(target=client.loop_send).start()
+            threading.Thread(target=client.loop_receive, args=(self._state,)).start()
+            self._state.request_snapshot(
+                lambda snapshot, client=client: self._attach(client, snapshot)
+            )
+
+        self._socket.close()
+        os.unlink(self._path)
+        for client in self._clients:
+            client.close()
+
+    def _attach(self, client: _Client, snapshot: StateSnapshot) -> None:
+        client.send(
+            {
+                "type": "attach",
+                "current_buffer": snapshot.current_buffer,
+                "buffers": [
+                    {
+                        "name": buf_name,
+                        "unread": unread,
+                        "end": buf_snapshot.end,
+                        "lines": encode_messages(
+                            buf_snapshot.window(
+                                buf_snapshot.end - ATTACH_LINES, buf_snapshot.end
+                            )
+                        ),
+                    }
+                    for (buf_name, (unread, buf_snapshot)) in snapshot.buffers.items()
+                ],
+            }
+        )
+        self._clients.append(client)
+
+    def _broadcast(self, obj: dict) -> None:
+        self._clients = [client for client in self._clients if not client.closed]
+        for client in self._clients:
+            client.send(obj)
+
+    def display_message(self, msg: BufferMessage, *, in_buffer: bool = False) -> None:
+        event = {"type": "message", "message": dataclasses.astuple(msg)}
+        if in_buffer:
+            event["buffer"] = self._state.current_buffer
+        self._broadcast(event)
+
+    def switch_to_buffer(self, buf_name: str | None, snapshot: BufferSnapshot) -> None:
+        self._broadcast(
+            {
+                "type": "switch",
+                "buffer": buf_name,
+                "end": snapshot.end,
+                "lines": encode_messages(snapshot),
+            }
+        )
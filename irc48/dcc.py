@@ -0,0 +1,266 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+"""DCC SEND file transfers, and the RESUME/ACCEPT extension.
+
+Each transfer runs in its own thread, which only updates its own
+:class:`Transfer` counters and reports to the State thread through
+:meth:`irc48.state.State.on_transfer_update`. Once that thread is started,
+its status is only changed with :meth:`Transfer.set_status`, as the State
+thread may cancel the transfer at any time."""
+
+from __future__ import annotations
+
+import dataclasses
+import enum
+import ipaddress
+import os
+import socket
+import struct
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from .state import State
+
+CHUNK_SIZE = 256 * 1024
+"""Size of the receive buffer, and of each sendfile() call"""
+
+TIMEOUT = 120
+"""Seconds to wait for the other side to connect, or to send data"""
+
+PART_SUFFIX = ".part"
+"""Appended to the path of files being received, until they are complete;
+only these files are ever resumed."""
+
+
+class Direction(enum.Enum):
+    SEND = "send"
+    RECEIVE = "receive"
+
+
+class Status(enum.Enum):
+    OFFERED = "offered"
+    """Waiting for the other side to connect to us, or for us to accept"""
+    RESUMING = "resuming"
+    """Sent DCC RESUME, waiting for DCC ACCEPT"""
+    ACTIVE = "active"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+def parse_ctcp_params(args: str) -> list[str]:
+    """Splits the parameters of a DCC request, whose first one is a filename
+    that may be quoted if it contains spaces."""
+    if args.startswith('"') and '"' in args[1:]:
+        (filename, rest) = args[1:].split('"', 1)
+        return [filename, *rest.split()]
+    else:
+        return args.split()
+
+
+def format_filename(filename: str) -> str:
+    return f'"{filename}"' if " " in filename else filename
+
+
+def format_address(address: str) -> str:
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv4Address):
+        # legacy format, still the only one understood by many clients
+        return str(int(ip))
+    else:
+        return str(ip)
+
+
+def parse_address(address: str) -> str:
+    if address.isdigit():
+        return str(ipaddress.IPv4Address(int(address)))
+    else:
+        return str(ipaddress.ip_address(address))
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+
+@dataclasses.dataclass
+class Transfer:
+    id: int
+    direction: Direction
+    nick: str
+    filename: str
+    """Name sent in the DCC request"""
+    path: str
+    """Local path of the file"""
+    size: int
+    address: str
+    port: int
+    status: Status = Status.OFFERED
+    position: int = 0
+    """Offset in the file the transfer starts from"""
+    transferred: int = 0
+    """Bytes transferred since ``position``"""
+    started_at: float | None = None
+    finished_at: float | None = None
+    _listener: socket.socket | None = None
+    _status_lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    @property
+    def part_path(self) -> str:
+        """Where the file is written until the transfer completes"""
+        return self.path + PART_SUFFIX
+
+    def throughput(self) -> float:
+        """Average throughput in bytes per second"""
+        if self.started_at is None:
+            return 0.0
+        duration = (self.finished_at or time.monotonic()) - self.started_at
+        return self.transferred / duration if duration > 0 else 0.0
+
+    def describe(self) -> str:
+        done = self.position + self.transferred
+        percent = done * 100 // self.size if self.size else 100
+        arrow = "->" if self.direction == Direction.SEND else "<-"
+        return (
+            f"[{self.id}] {arrow} {self.nick} {self.filename}: {self.status.value}, "
+            f"{format_size(done)}/{format_size(self.size)} ({percent}%), "
+            f"{format_size(self.throughput())}/s"
+        )
+
+    def listen(self, local_address: str) -> None:
+        """Opens the socket the receiver will connect to, and sets ``port``"""
+        family = socket.AF_INET6 if ":" in local_address else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.bind((local_address, 0))
+        self._listener.listen(1)
+        self._listener.settimeout(0.1)  # want to exit the thread early when requested
+        self.port = self._listener.getsockname()[1]
+
+    def start(self, state: State) -> None:
+        if self.direction == Direction.SEND:
+            target = self._run_send
+        else:
+            target = self._run_receive
+        threading.Thread(target=self._run, args=(state, target), daemon=True).start()
+
+    def set_status(self, status: Status, *, unless: tuple[Status, ...] = ()) -> bool:
+        """Changes the status, unless it is one of ``unless``; returns whether
+        it was changed."""
+        with self._status_lock:
+            if self.status in unless:
+                return False
+            self.status = status
+            return True
+
+    def cancel(self) -> bool:
+        return self.set_status(
+            Status.CANCELLED, unless=(Status.DONE, Status.FAILED, Status.CANCELLED)
+        )
+
+    def _is_cancelled(self, state: State) -> bool:
+        return state.shut_down or self.status == Status.CANCELLED
+
+    def _run(self, state: State, target: typing.Callable[[State], None]) -> None:
+        try:
+            target(state)
+        except Exception as e:
+            self.finished_at = time.monotonic()
+            self.set_status(Status.FAILED, unless=(Status.CANCELLED,))
+            state.on_transfer_update(self, f"{self.describe()}: {e}")
+        else:
+            self.finished_at = time.monotonic()
+            self.set_status(Status.DONE, unless=(Status.CANCELLED,))
+            state.on_transfer_update(self, self.describe())
+
+    def _run_send(self, state: State) -> None:
+        assert self._listener is not None
+        deadline = time.monotonic() + TIMEOUT
+        with self._listener:
+            while True:
+                if self._is_cancelled(state):
+                    return
+                try:
+                    (sock, _) = self._listener.accept()
+                except socket.timeout:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{self.nick} did not connect") from None
+                    continue
+                break
+
+        with sock, open(self.path, "rb") as f:
+            sock.settimeout(TIMEOUT)
+            if not self.set_status(Status.ACTIVE, unless=(Status.CANCELLED,)):
+                return
+            self.started_at = time.monotonic()
+            offset = self.position
+            while offset < self.size:
+                if self._is_cancelled(state):
+                    return
+                # Uses os.sendfile(), and waits for the socket to be writable
+                # (as it has a timeout)
+                count = min(CHUNK_SIZE, self.size - offset)
+                sent = sock.sendfile(f, offset, count)
+                if sent == 0:
+                    raise OSError(f"{self.path} was truncated")
+                offset += sent
+                self.transferred += sent
+
+            # Let the receiver close the connection once it got everything,
+            # reading and ignoring its acknowledgements.
+            sock.shutdown(socket.SHUT_WR)
+            while sock.recv(CHUNK_SIZE):
+                pass
+
+    def _run_receive(self, state: State) -> None:
+        mode = "r+b" if self.position else "wb"
+        address = (self.address, self.port)
+        with socket.create_connection(address, timeout=TIMEOUT) as sock:
+            # before opening the file, which may truncate it
+            if not self.set_status(Status.ACTIVE, unless=(Status.CANCELLED,)):
+                return
+            with open(self.part_path, mode) as f:
+                self._receive(state, sock, f)
+
+        if self.position + self.transferred == self.size:
+            # Unlike rename(), fails instead of replacing a file created since
+            os.link(self.part_path, self.path)
+            os.unlink(self.part_path)
+
+    def _receive(self, state: State, sock: socket.socket, f: typing.BinaryIO) -> None:
+        buf = bytearray(CHUNK_SIZE)
+        view = memoryview(buf)
+        f.seek(self.position)
+        f.truncate()
+        self.started_at = time.monotonic()
+        while self.position + self.transferred < self.size:
+            if self._is_cancelled(state):
+                return
+            # Never read past the advertised size
+            remaining = self.size - self.position - self.transferred
+            received = sock.recv_into(view[: min(CHUNK_SIZE, remaining)])
+            if received == 0:
+                raise OSError(f"{self.nick} closed the connection early")
+            f.write(view[:received])
+            self.transferred += received
+            # Acknowledge the total received so far, as a 32 bits integer
+            done = self.position + self.transferred
+            sock.sendall(struct.pack("!I", done & 0xFFFFFFFF))
@@ -0,0 +1,127 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+from __future__ import annotations
+
+import json
+import socket
+import typing
+
+from .daemon import ATTACH_LINES, decode_messages
+from .state import BUFFER_SIZE
+from .ui import UI
+
+if typing.TYPE_CHECKING:
+    from .state import BufferMessage
+
+
+class Frontend:
+    """Terminal frontend attached to a :class:`irc48.daemon.Daemon`.
+
+    Plays the role of :class:`irc48.state.State` for :class:`irc48.ui.UI`:
+    user input is forwarded to the daemon, except for ``/detach`` and
+    ``/more`` which are handled locally."""
+
+    def __init__(self, path: str):
+        self.shut_down = False
+        self.current_buffer: str | None = None
+        self._lines: list[BufferMessage] = []
+        """Lines of the current buffer, to redraw it after fetching scrollback"""
+        self._start = 0
+        """Sequence number of ``self._lines[0]``"""
+        self._max_lines = BUFFER_SIZE
+        """Maximum length of ``self._lines``, grows when fetching scrollback"""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self.ui = UI(self)
+
+    def _send(self, obj: dict) -> None:
+        self._socket.sendall(json.dumps(obj, separators=(",", ":")).encode() + b"\n")
+
+    def on_user_input(self, s: str) -> None:
+        if s == "/detach":
+            self.shut_down = True
+            self._socket.shutdown(socket.SHUT_RDWR)
+        elif s == "/more":
+            self._send(
+                {
+                    "type": "scrollback",
+                    "buffer": self.current_buffer,
+                    "start": self._start - ATTACH_LINES,
+                    "end": self._start,
+                }
+            )
+        else:
+            self._send({"type": "input", "line": s})
+
+    def _switch_to_buffer(self, buf_name: str | None, end: int, lines: list) -> None:
+        self.current_buffer = buf_name
+        self._lines = decode_messages(lines)
+        self._start = end - len(self._lines)
+        self._max_lines = BUFFER_SIZE
+        self.ui.switch_to_buffer(buf_name, list(self._lines))
+
+    def loop(self) -> None:
+        with self._socket.makefile("rb") as f:
+            for line in f:
+                event = json.loads(line)
+                if event["type"] == "attach":
+                    for buf in event["buffers"]:
+                        if buf["name"] == event["current_buffer"]:
+                            self._switch_to_buffer(
+                                buf["name"], buf["end"], buf["lines"]
+                            )
+                    unread = " ".join(
+                        f"{buf['name']} ({buf['unread']})"
+                        for buf in event["buffers"]
+                        if buf["unread"]
+                    )
+                    if unread:
+                        self._display_info(f"Unread: {unread}")
+                elif event["type"] == "message":
+                    (msg,) = decode_messages([event["message"]])
+                    if "buffer" in event and event["buffer"] == self.current_buffer:
+                        self._lines.append(msg)
+                        if len(self._lines) > self._max_lines:
+                            del self._lines[0]
+                            self._start += 1
+                    self.ui.display_message(msg)
+                elif event["type"] == "switch":
+                    self._switch_to_buffer(
+                        event["buffer"], event["end"], event["lines"]
+                    )
+                elif event["type"] == "scrollback":
+                    if event["buffer"] != self.current_buffer:
+                        continue
+                    elif event["lines"]:
+                        lines = decode_messages(event["lines"])
+                        self._lines[0:0] = lines
+                        self._start = event["start"]
+                        self._max_lines += len(lines)
+                        self.ui.switch_to_buffer(
+                            self.current_buffer, list(self._lines)
+                        )
+                    else:
+                        self._display_info("No more scrollback")
+
+        if not self.shut_down:
+            self._display_info("Daemon closed the connection")
+        self.shut_down = True
+
+    def _display_info(self, info: str) -> None:
+        from .state import BufferMessage
+
+        self.ui.display_message(BufferMessage(author=None, content=info))
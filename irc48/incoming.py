@@ -16,14 +16,26 @@
 
 from __future__ import annotations
 
+import base64
+import os
 import typing
 
+from . import dcc
 from .message import Message
 
 if typing.TYPE_CHECKING:
     from .state import State, BufferMessage
 
 
+def _safe_filename(filename: str) -> str:
+    """Where to save a file offered over DCC, so the sender cannot pick
+    a path outside the current directory"""
+    filename = os.path.basename(filename.replace("\\", "/"))
+    if filename in ("", ".", ".."):
+        return "unnamed"
+    return filename
+
+
 class IncomingHandler:
     def __init__(self, state: State):
         self._state = state
@@ -59,15 +71,279 @@ class IncomingHandler:
         """ERR_NICKNAMEINUSE"""
         self._passthrough(msg)
         self._state.nick_attempt_count += 1
-        self._state.current_nick = (
-            f"{self._state.default_nick}{self._state.nick_attempt_count}"
-        )
+        alternative_nicks = self._state.alternative_nicks
+        if self._state.nick_attempt_count <= len(alternative_nicks):
+            nick = alternative_nicks[self._state.nick_attempt_count - 1]
+        else:
+            nick = f"{self._state.default_nick}{self._state.nick_attempt_count}"
+        self._state.current_nick = nick
         self._state.send_message_with_echo("NICK", [self._state.current_nick])
 
+    def on005(self, msg: Message) -> None:
+        """RPL_ISUPPORT"""
+        for token in msg.params[1:-1]:
+            if token.startswith("-"):
+                self._state.isupport.pop(token[1:], None)
+            else:
+                (key, _, value) = token.partition("=")
+                self._state.isupport[key] = value
+        self._passthrough(msg)
+
+    def on376(self, msg: Message) -> None:
+        """RPL_ENDOFMOTD"""
+        self._passthrough(msg)
+        # Comes after RPL_WELCOME and RPL_ISUPPORT, so we know the server's
+        # limits when packing the JOINs
+        self._state.autojoin()
+
+    on422 = on376  # ERR_NOMOTD
+
+    def onCap(self, msg: Message) -> None:
+        self._passthrough(msg)
+        if len(msg.params) < 3 or not self._state.network.sasl:
+            return
+        subcommand = msg.params[1].upper()
+        if subcommand == "ACK" and "sasl" in msg.params[2].lower().split():
+            self._state.send_message_with_echo("AUTHENTICATE", ["PLAIN"])
+        elif subcommand == "NAK":
+            self._state.display_error("Server does not support SASL")
+            self._state.send_message_with_echo("CAP", ["END"])
+
+    def onAuthenticate(self, msg: Message) -> None:
+        sasl = self._state.network.sasl
+        if msg.params != ["+"] or not sasl:
+            self._passthrough(msg)
+            return
+        credentials = base64.b64encode(
+            f"{sasl.username}\0{sasl.username}\0{sasl.password}".encode()
+        ).decode()
+        # Not echoed, as it contains the password
+        for i in range(0, len(credentials), 400):
+            self._state.send_message("AUTHENTICATE", [credentials[i : i + 400]])
+        if len(credentials) % 400 == 0:
+            self._state.send_message("AUTHENTICATE", ["+"])
+
+    def on903(self, msg: Message) -> None:
+        """RPL_SASLSUCCESS, and failures"""
+        self._passthrough(msg)
+        self._state.send_message_with_echo("CAP", ["END"])
+
+    on902 = on904 = on905 = on906 = on907 = on903
+
+    def _on_dcc(self, author: str, request: str) -> None:
+        (dcc_command, _, args) = request.partition(" ")
+        params = dcc.parse_ctcp_params(args)
+        dcc_command = dcc_command.upper()
+        try:
+            if dcc_command == "SEND":
+                (filename, address, port, size) = params[0:4]
+                self._on_dcc_send(author, filename, address, int(port), int(size))
+            elif dcc_command == "RESUME":
+                (filename, port, position) = params[0:3]
+                self._on_dcc_resume(author, int(port), int(position))
+            elif dcc_command == "ACCEPT":
+                (filename, port, position) = params[0:3]
+                self._on_dcc_accept(author, int(port), int(position))
+            else:
+                raise ValueError(f"unsupported request {dcc_command}")
+        except ValueError as e:
+            self._state.display_error(f"Invalid DCC request from {author}: {e}")
+
+    def _find_transfer(
+        self, direction: dcc.Direction, author: str, port: int
+    ) -> dcc.Transfer | None:
+        for transfer in self._state.transfers.values():
+            if (
+                transfer.direction == direction
+                and transfer.nick.lower() == author.lower()
+                and transfer.port == port
+            ):
+                return transfer
+        return None
+
+    def _on_dcc_send(
+        self, author: str, filename: str, address: str, port: int, size: int
+    ) -> None:
+        if port == 0:
+            raise ValueError("passive DCC is not supported")
+        transfer = dcc.Transfer(
+            id=self._state.next_transfer_id,
+            direction=dcc.Direction.RECEIVE,
+            nick=author,
+            filename=filename,
+            path=_safe_filename(filename),
+            size=size,
+            address=dcc.parse_address(address),
+            port=port,
+        )
+        self._state.next_transfer_id += 1
+        self._state.transfers[transfer.id] = transfer
+        self._state.display_info(
+            f"DCC {author} offers {filename} ({dcc.format_size(size)}), "
+            f"use /dcc get {transfer.id} to accept it"
+        )
+
+    def _on_dcc_resume(self, author: str, port: int, position: int) -> None:
+        """The receiver of one of our offers asks us to start from ``position``"""
+        transfer = self._find_transfer(dcc.Direction.SEND, author, port)
+        if transfer is None or transfer.status != dcc.Status.OFFERED:
+            raise ValueError(f"no pending offer on port {port}")
+        if not 0 <= position <= transfer.size:
+            raise ValueError(f"cannot resume from {position}")
+        transfer.position = position
+        self._state.send_ctcp(
+            author,
+            f"DCC ACCEPT {dcc.format_filename(transfer.filename)} {port} {position}",
+        )
+
+    def _on_dcc_accept(self, author: str, port: int, position: int) -> None:
+        """The sender of an offer agreed to our DCC RESUME"""
+        transfer = self._find_transfer(dcc.Direction.RECEIVE, author, port)
+        if transfer is None or transfer.status != dcc.Status.RESUMING:
+            raise ValueError(f"no pending resume on port {port}")
+        transfer.position = position
+        transfer.start(self._state)
+
+    def _get_open_table(self, buf_name: str | None) -> str | None:
+        table = self._state.tables.get(buf_name)
+        if table is None or table.complete:
+            return None
+        return buf_name
+
+    def on321(self, msg: Message) -> None:
+        """RPL_LISTSTART"""
+        if not self._get_open_table("*list"):
+            self._passthrough(msg)
+
+    def on322(self, msg: Message) -> None:
+        """RPL_LIST"""
+        buf_name = self._get_open_table("*list")
+        if buf_name and len(msg.params) == 4:
+            (_, channel, users, topic) = msg.params
+            self._state.add_table_row(buf_name, (channel, users, topic))
+        else:
+            self._passthrough(msg)
+
+    def on323(self, msg: Message) -> None:
+        """RPL_LISTEND"""
+        if buf_name := self._get_open_table("*list"):
+            self._state.close_table(buf_name)
+        else:
+            self._passthrough(msg)
+
+    def on352(self, msg: Message) -> None:
+        """RPL_WHOREPLY"""
+        pending_who = self._state.pending_who
+        buf_name = pending_who and self._get_open_table(pending_who[0])
+        if buf_name and len(msg.params) == 8:
+            (_, channel, user, host, server, nick, flags, trailing) = msg.params
+            (_, realname) = (trailing.split(" ", 1) + [""])[0:2]
+            self._state.add_table_row(
+                buf_name, (nick, user, host, server, channel, flags, realname)
+            )
+        else:
+            self._passthrough(msg)
+
+    def on315(self, msg: Message) -> None:
+        """RPL_ENDOFWHO"""
+        if len(msg.params) < 2 or not self._close_who_table(msg.params[1]):
+            self._passthrough(msg)
+
+    def _close_who_table(self, mask: str | None) -> bool:
+        """Stops waiting for replies to a WHO, the oldest one if ``mask`` is
+        None; returns whether there was one."""
+        pending_who = self._state.pending_who
+        if mask is None:
+            if not pending_who:
+                return False
+            buf_name = pending_who[0]
+        else:
+            matching = [
+                buf_name
+                for buf_name in pending_who
+                if buf_name.lower() == f"*who {mask}".lower()
+            ]
+            if not matching:
+                return False
+            buf_name = matching[0]
+        pending_who.remove(buf_name)
+        if self._get_open_table(buf_name):
+            self._state.close_table(buf_name)
+        return True
+
+    def _close_list_table(self) -> bool:
+        if buf_name := self._get_open_table("*list"):
+            self._state.close_table(buf_name)
+            return True
+        return False
+
+    def on263(self, msg: Message) -> None:
+        """RPL_TRYAGAIN, and ERR_NEEDMOREPARAMS"""
+        self._passthrough(msg)
+        command = msg.params[1].upper() if len(msg.params) >= 3 else None
+        if command == "WHO":
+            self._close_who_table(None)
+        elif command == "LIST":
+            self._close_list_table()
+
+    on461 = on263
+
+    def on481(self, msg: Message) -> None:
+        """ERR_NOPRIVILEGES, does not tell which command it is about"""
+        self._passthrough(msg)
+        if not self._close_list_table():
+            self._close_who_table(None)
+
+    def on353(self, msg: Message) -> None:
+        """RPL_NAMREPLY"""
+        if len(msg.params) == 4 and (
+            buf_name := self._get_open_table(f"*names {msg.params[2].lower()}")
+        ):
+            for name in msg.params[3].split():
+                nick = name.lstrip("~&@%+")
+                status = name[: len(name) - len(nick)]
+                self._state.add_table_row(buf_name, (status, nick))
+        else:
+            self._passthrough(msg)
+
+    def on366(self, msg: Message) -> None:
+        """RPL_ENDOFNAMES"""
+        if len(msg.params) >= 2 and (
+            buf_name := self._get_open_table(f"*names {msg.params[1].lower()}")
+        ):
+            self._state.close_table(buf_name)
+        else:
+            self._passthrough(msg)
+        if len(msg.params) >= 2:
+            # last message of the burst following the JOIN
+            self._state.autojoin_pending.discard(msg.params[1].lower())
+
+    def on471(self, msg: Message) -> None:
+        """ERR_CHANNELISFULL, and other errors preventing us from joining"""
+        if len(msg.params) >= 2:
+            self._state.autojoin_pending.discard(msg.params[1].lower())
+        self._passthrough(msg)
+
+    # ERR_TOOMANYCHANNELS, ERR_INVITEONLYCHAN, ERR_BANNEDFROMCHAN,
+    # ERR_BADCHANNELKEY, ERR_BADCHANMASK
+    on405 = on473 = on474 = on475 = on476 = on471
+
+    def on403(self, msg: Message) -> None:
+        """ERR_NOSUCHCHANNEL, in reply to JOIN or WHO"""
+        self.on471(msg)
+        if len(msg.params) >= 2:
+            self._close_who_table(msg.params[1])
+
     def onJoin(self, msg: Message) -> None:
         if msg.source and msg.source.split("!")[0] == self._state.current_nick:
-            # we just joined a channel, switch to that buffer
-            self._state.switch_to_buffer(msg.params[0])
+            channel = msg.params[0].lower()
+            if channel in self._state.autojoin_pending:
+                # joined from the configuration, don't switch buffers for each
+                # channel of the burst
+                pass
+            else:
+                # we just joined a channel, switch to that buffer
+                self._state.switch_to_buffer(msg.params[0])
         self._passthrough(msg)
 
     def onPrivmsg(self, msg: Message) -> None:
@@ -75,6 +351,10 @@ class IncomingHandler:
 
         author = msg.source and msg.source.split("!")[0]
         content = msg.params[1]
+        if content.startswith("\x01DCC ") and content.endswith("\x01"):
+            if author and msg.params[0].lower() == self._state.current_nick.lower():
+                self._on_dcc(author, content[5:-1])
+                return
         action = False
         if content.startswith("\x01ACTION ") and content.endswith("\x01"):
             action = True
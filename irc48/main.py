@@ -18,38 +18,137 @@ import queue
 import sys
 import threading
 
+from .config import ConfigError, NetworkConfig, load_network
 from .connection import Connection
+from .daemon import Daemon, DaemonError
+from .frontend import Frontend
 from .state import State
 from .ui import UI
 
 
+SYNTAX = """Syntax:
+    python3 -m irc48 <network>
+    python3 -m irc48 daemon <socket path> <network>
+    python3 -m irc48 attach <socket path>
+
+where <network> is either:
+    <hostname> <port> <nick>
+    --config <config path> <network name>"""
+
+
 def main(argv: list[str]):
     try:
-        (_, hostname, port_s, nick) = argv
-        port = int(port_s)
+        if argv[1:2] == ["daemon"]:
+            (_, _, socket_path, *network_args) = argv
+        elif argv[1:2] == ["attach"]:
+            (_, _, socket_path) = argv
+        else:
+            socket_path = None
+            (_, *network_args) = argv
+    except ValueError:
+        print(SYNTAX, file=sys.stderr)
+        exit(1)
+
+    if argv[1:2] == ["attach"]:
+        run_frontend(socket_path)
+        return
+
+    network = get_network(network_args)
+
+    if socket_path is None:
+        run_client(network)
+    else:
+        run_daemon(socket_path, network)
+
+
+def get_network(network_args: list[str]) -> NetworkConfig:
+    try:
+        if network_args[0:1] == ["--config"]:
+            (_, config_path, network_name) = network_args
+            return load_network(config_path, network_name)
+        else:
+            (hostname, port_s, nick) = network_args
+            return NetworkConfig(hostname=hostname, port=int(port_s), nicks=[nick])
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        exit(1)
     except ValueError:
-        print("Syntax: python3 -m irc48 <hostname> <port> <nick>", file=sys.stderr)
+        print(SYNTAX, file=sys.stderr)
         exit(1)
 
-    state = State(default_nick=nick)
-    connection = Connection(hostname, port, tls=True)
+
+def run_client(network: NetworkConfig) -> None:
+    state = State(network)
+    connection = Connection(network.hostname, network.port, tls=network.tls)
     ui = UI(state)
 
     try:
         state.attach_ui(ui)
         state.attach_connection(connection)
 
+        state_thread = threading.Thread(target=state.loop)
         connection_thread = threading.Thread(target=connection.loop, args=(state,))
         ui.start()
         input_thread = threading.Thread(target=ui.loop_input)
         display_thread = threading.Thread(target=ui.loop_display)
 
+        state_thread.start()
         connection_thread.start()
         input_thread.start()
         display_thread.start()
 
+        state_thread.join()
         connection_thread.join()
         input_thread.join()
         display_thread.join()
     except KeyboardInterrupt:
         state.shut_down = True
+
+
+def run_daemon(socket_path: str, network: NetworkConfig) -> None:
+    state = State(network)
+    daemon = Daemon(state, socket_path)
+    try:
+        daemon.start()
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    connection = Connection(network.hostname, network.port, tls=network.tls)
+
+    try:
+        state.attach_ui(daemon)
+        state.attach_connection(connection)
+
+        state_thread = threading.Thread(target=state.loop)
+        connection_thread = threading.Thread(target=connection.loop, args=(state,))
+        accept_thread = threading.Thread(target=daemon.loop_accept)
+
+        state_thread.start()
+        connection_thread.start()
+        accept_thread.start()
+
+        state_thread.join()
+        connection_thread.join()
+        accept_thread.join()
+    except KeyboardInterrupt:
+        state.shut_down = True
+
+
+def run_frontend(socket_path: str) -> None:
+    frontend = Frontend(socket_path)
+
+    try:
+        frontend.ui.start()
+        socket_thread = threading.Thread(target=frontend.loop)
+        input_thread = threading.Thread(target=frontend.ui.loop_input)
+        display_thread = threading.Thread(target=frontend.ui.loop_display)
+
+        socket_thread.start()
+        input_thread.start()
+        display_thread.start()
+
+        socket_thread.join()
+        input_thread.join()
+        display_thread.join()
+    except KeyboardInterrupt:
+        frontend.shut_down = True
@@ -38,6 +38,47 @@ COMMANDS_WITH_CHANNEL = "JOIN PART TOPIC NAMES KICK".split()
 COMMANDS_WITH_NICK_OR_CHANNEL = "MODE PRIVMSG NOTICE".split()
 
 
+def _join_params(names: list[str], keys: list[str]) -> list[str]:
+    if keys:
+        return [",".join(names), ",".join(keys)]
+    else:
+        return [",".join(names)]
+
+
+def pack_joins(
+    channels: list[tuple[str, str | None]],
+    max_length: int = MAX_LINE_LENGTH,
+    max_targets: int | None = None,
+) -> list[list[str]]:
+    """Groups channels (and their key, if any) into as few JOIN messages as
+    allowed by the line length and the server's TARGMAX; returns the params
+    of each message."""
+    # Channels with a key go first, so keys line up with their channel
+    channels = sorted(channels, key=lambda channel: channel[1] is None)
+    overhead = len("JOIN  :\r\n")
+    messages: list[list[str]] = []
+    names: list[str] = []
+    keys: list[str] = []
+    length = overhead
+    for (name, key) in channels:
+        added_length = len(name.encode()) + 1 + (len(key.encode()) + 1 if key else 0)
+        if names and (
+            length + added_length > max_length
+            or (max_targets is not None and len(names) >= max_targets)
+        ):
+            messages.append(_join_params(names, keys))
+            names = []
+            keys = []
+            length = overhead
+        names.append(name)
+        if key:
+            keys.append(key)
+        length += added_length
+    if names:
+        messages.append(_join_params(names, keys))
+    return messages
+
+
 @dataclasses.dataclass
 class Message:
     command: str
@@ -16,8 +16,12 @@
 
 from __future__ import annotations
 
+import os
+import re
 import typing
 
+from . import dcc
+
 if typing.TYPE_CHECKING:
     from .state import State, BufferMessage
 
@@ -46,12 +50,17 @@ class OutgoingHandler:
         self._state.display_info(
             "Buffer list: "
             + " ".join(
-                buf_name for buf_name in self._state.messages if buf_name is not None
+                f"{buf_name} ({self._state.unread[buf_name]})"
+                if self._state.unread[buf_name]
+                else buf_name
+                for buf_name in self._state.messages
+                if buf_name is not None
             ),
         )
 
     def onNick(self, command: str, nick: str) -> None:
         self._state.default_nick = nick
+        self._state.alternative_nicks = []
         self._state.nick_attempt_count = 0
         self._passthrough(command, nick)
 
@@ -69,6 +78,7 @@ class OutgoingHandler:
             (target, content) = args.split(maxsplit=1)
         except ValueError:
             self._state.display_error(f"Syntax: /{command} <target> <message>")
+            return
 
         buf_msg = BufferMessage(
             author=self._state.current_nick,
@@ -82,6 +92,158 @@ class OutgoingHandler:
     def onMe(self, command: str, args: str) -> None:
         self._state.on_user_input(f"\x01ACTION {args}\x01")
 
+    def onList(self, command: str, args: str) -> None:
+        # args are sent as-is, so they may be server-side ELIST filters
+        from .table import LIST_COLUMNS
+
+        self._state.open_table("*list", LIST_COLUMNS)
+        self._passthrough(command, args)
+
+    def onWho(self, command: str, args: str) -> None:
+        from .table import WHO_COLUMNS
+
+        if not args:
+            self._state.display_error("Syntax: /who <mask>")
+            return
+        buf_name = f"*who {args.split()[0]}"
+        self._state.open_table(buf_name, WHO_COLUMNS)
+        self._state.pending_who.append(buf_name)
+        self._passthrough(command, args)
+
+    def onNames(self, command: str, args: str) -> None:
+        from .table import NAMES_COLUMNS
+
+        channel = args.strip() or self._state.current_buffer
+        if channel is None or not self._state.is_channel(channel) or "," in channel:
+            # the server replies with one list per channel, not worth a table
+            self._passthrough(command, args)
+            return
+        # servers reply with the channel's own case
+        self._state.open_table(f"*names {channel.lower()}", NAMES_COLUMNS)
+        self._passthrough(command, channel)
+
+    def onTable(self, command: str, args: str) -> None:
+        buf_name = self._state.current_buffer
+        table = self._state.tables.get(buf_name)
+        if buf_name is None or table is None:
+            self._state.display_error("This is not a /list, /who, or /names buffer")
+            return
+
+        (subcommand, *params) = args.split(maxsplit=2) or [""]
+        try:
+            if subcommand == "sort" and len(params) == 1:
+                table.set_sort(params[0], reverse=False)
+            elif subcommand == "rsort" and len(params) == 1:
+                table.set_sort(params[0], reverse=True)
+            elif subcommand == "filter" and len(params) == 2:
+                table.set_filter(params[0], params[1])
+            elif subcommand == "min" and len(params) == 2:
+                table.set_minimum(params[0], int(params[1]))
+            elif subcommand == "reset" and not params:
+                table.reset()
+            elif subcommand == "page" and len(params) == 1:
+                table.page = min(max(0, int(params[0]) - 1), table.page_count() - 1)
+            elif subcommand == "next" and not params:
+                table.page = min(table.page + 1, table.page_count() - 1)
+            elif subcommand == "prev" and not params:
+                table.page = max(table.page - 1, 0)
+            else:
+                self._state.display_error(
+                    "Syntax: /table sort|rsort <column>, /table filter <column> "
+                    "<regexp>, /table min <column> <number>, /table reset, "
+                    "/table page <number>, /table next, /table prev"
+                )
+                return
+        except (ValueError, re.error) as e:
+            self._state.display_error(str(e))
+            return
+
+        self._state.render_table(buf_name)
+
+    def onDcc(self, command: str, args: str) -> None:
+        (subcommand, *params) = args.split(maxsplit=2) or [""]
+        subcommand = subcommand.lower()
+        try:
+            if subcommand == "send" and len(params) == 2:
+                self._dcc_send(*params)
+            elif subcommand == "get" and len(params) == 1:
+                self._dcc_get(self._get_transfer(params[0]))
+            elif subcommand == "cancel" and len(params) == 1:
+                transfer = self._get_transfer(params[0])
+                if not transfer.cancel():
+                    raise ValueError(f"Transfer {transfer.id} already ended")
+            elif subcommand == "list" and not params:
+                for transfer in self._state.transfers.values():
+                    self._state.display_info(transfer.describe())
+            else:
+                self._state.display_error(
+                    "Syntax: /dcc send <nick> <path>, /dcc get <id>, "
+                    "/dcc cancel <id>, /dcc list"
+                )
+        except (ValueError, OSError) as e:
+            self._state.display_error(f"DCC: {e}")
+
+    def _get_transfer(self, transfer_id: str) -> dcc.Transfer:
+        try:
+            return self._state.transfers[int(transfer_id)]
+        except (ValueError, KeyError):
+            raise ValueError(f"No transfer with id {transfer_id}") from None
+
+    def _dcc_send(self, nick: str, path: str) -> None:
+        path = os.path.expanduser(path)
+        address = self._state.local_address
+        transfer = dcc.Transfer(
+            id=self._state.next_transfer_id,
+            direction=dcc.Direction.SEND,
+            nick=nick,
+            filename=os.path.basename(path),
+            path=path,
+            size=os.stat(path).st_size,
+            address=address,
+            port=0,
+        )
+        transfer.listen(address)
+        self._state.next_transfer_id += 1
+        self._state.transfers[transfer.id] = transfer
+        transfer.start(self._state)
+        self._state.send_ctcp(
+            nick,
+            f"DCC SEND {dcc.format_filename(transfer.filename)} "
+            f"{dcc.format_address(address)} {transfer.port} {transfer.size}",
+        )
+        self._state.display_info(f"DCC {transfer.describe()}")
+
+    def _dcc_get(self, transfer: dcc.Transfer) -> None:
+        if (
+            transfer.direction != dcc.Direction.RECEIVE
+            or transfer.status != dcc.Status.OFFERED
+        ):
+            raise ValueError(f"Transfer {transfer.id} is not a pending offer")
+        for other in self._state.transfers.values():
+            if (
+                other.direction == dcc.Direction.RECEIVE
+                and other.path == transfer.path
+                and other.status in (dcc.Status.RESUMING, dcc.Status.ACTIVE)
+            ):
+                raise ValueError(f"Transfer {other.id} is already writing {other.path}")
+        if os.path.lexists(transfer.path):
+            raise ValueError(f"{transfer.path} already exists")
+        try:
+            existing_size = os.stat(transfer.part_path).st_size
+        except FileNotFoundError:
+            existing_size = 0
+        if 0 < existing_size < transfer.size:
+            # Partial download, ask the sender to start from there
+            transfer.status = dcc.Status.RESUMING
+            self._state.send_ctcp(
+                transfer.nick,
+                f"DCC RESUME {dcc.format_filename(transfer.filename)} "
+                f"{transfer.port} {existing_size}",
+            )
+        else:
+            transfer.start(self._state)
+        self._state.display_info(f"DCC {transfer.describe()}")
+
     def _on_prepend_channel(self, command: str, args: str):
         if not self._state.is_channel(args.split(maxsplit=1)[0]):
             if self._state.current_buffer is None:
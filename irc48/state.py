@@ -18,18 +18,27 @@ from __future__ import annotations
 
 import collections
 import dataclasses
+import queue
+import time
 import typing
 
-from .message import Message
+from .message import MAX_LINE_LENGTH, Message, pack_joins
+from .table import PAGE_SIZE, ResultTable
 from .incoming import IncomingHandler
 from .outgoing import OutgoingHandler
 
 if typing.TYPE_CHECKING:
+    from .config import NetworkConfig
     from .connection import Connection
+    from .daemon import Daemon
+    from .dcc import Transfer
     from .ui import UI
 
 BUFFER_SIZE = 100
 
+TABLE_PROGRESS_INTERVAL = 1.0
+"""Minimum time between two progress reports of a result table, in seconds"""
+
 
 @dataclasses.dataclass
 class BufferMessage:
@@ -39,43 +48,224 @@ class BufferMessage:
     action: bool = False
 
 
+class Buffer:
+    """Ring of the last ``size`` messages of a buffer.
+
+    Only the State thread appends; other threads call :meth:`snapshot`, which
+    neither copies nor locks. Each slot holds a ``(seq, message)`` pair, so a
+    snapshot can tell when a slot was overwritten after it was taken."""
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self._slots: list[tuple[int, BufferMessage] | None] = [None] * size
+        self.next_seq = 0
+
+    def __len__(self) -> int:
+        return min(self.next_seq, len(self._slots))
+
+    def append(self, msg: BufferMessage) -> None:
+        seq = self.next_seq
+        self._slots[seq % len(self._slots)] = (seq, msg)
+        self.next_seq = seq + 1
+
+    def snapshot(self) -> BufferSnapshot:
+        return BufferSnapshot(self._slots, self.next_seq)
+
+
+@dataclasses.dataclass(frozen=True)
+class BufferSnapshot:
+    """Immutable view of a :class:`Buffer`, up to (excluding) sequence number
+    ``end``. Messages overwritten by the writer since are skipped."""
+
+    slots: list[tuple[int, BufferMessage] | None]
+    end: int
+
+    @property
+    def start(self) -> int:
+        return max(0, self.end - len(self.slots))
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __iter__(self) -> typing.Iterator[BufferMessage]:
+        return self.window(self.start, self.end)
+
+    def window(self, start: int, end: int) -> typing.Iterator[BufferMessage]:
+        return (msg for (_, msg) in self.items(start, end))
+
+    def items(
+        self, start: int, end: int
+    ) -> typing.Iterator[tuple[int, BufferMessage]]:
+        """Sequence numbers and messages in ``[start, end)``"""
+        size = len(self.slots)
+        for seq in range(max(start, self.start), min(end, self.end)):
+            slot = self.slots[seq % size]
+            if slot is not None and slot[0] == seq:
+                yield slot
+
+
+class _Event:
+    pass
+
+
+@dataclasses.dataclass
+class IncomingMessage(_Event):
+    msg: Message
+
+
+@dataclasses.dataclass
+class UserInput(_Event):
+    line: str
+
+
+@dataclasses.dataclass
+class TransferUpdate(_Event):
+    transfer: Transfer
+    info: str
+
+
+@dataclasses.dataclass
+class SnapshotRequest(_Event):
+    callback: typing.Callable[[StateSnapshot], None]
+
+
+@dataclasses.dataclass(frozen=True)
+class StateSnapshot:
+    current_buffer: str | None
+    buffers: dict[str | None, tuple[int, BufferSnapshot]]
+    """Unread count and snapshot of each buffer"""
+
+
 class State:
+    """Client state. All changes are applied by the thread running
+    :meth:`loop`; other threads submit events through the ``on_*`` methods."""
+
     _connection: Connection
-    messages: dict[str | None, collections.deque[BufferMessage]]
-    _ui: UI
+    messages: dict[str | None, Buffer]
+    unread: collections.Counter[str | None]
+    tables: dict[str, ResultTable]
+    transfers: dict[int, Transfer]
+    _ui: UI | Daemon
 
-    def __init__(self, default_nick: str):
+    def __init__(self, network: NetworkConfig):
         self.shut_down = False
-        self.default_nick = default_nick
-        self.current_nick = default_nick
+        self.network = network
+        self.default_nick = network.nicks[0]
+        self.alternative_nicks = network.nicks[1:]
+        self.current_nick = self.default_nick
         self.nick_attempt_count = 0
+        self.isupport: dict[str, str] = {}
+        self.autojoined = False
+        self.autojoin_pending: set[str] = set()
+        """Channels we sent an automatic JOIN for, until the end of the NAMES
+        reply that follows it (or an error)"""
         self.current_buffer: str | None = None
-        self.messages = collections.defaultdict(
-            lambda: collections.deque(maxlen=BUFFER_SIZE)
-        )
+        self.messages = collections.defaultdict(Buffer)
+        self.unread = collections.Counter()
+        self.tables = {}
+        self.pending_who: collections.deque[str] = collections.deque()
+        """Names of the tables of WHO requests the server did not answer yet"""
+        self._table_progress_time = 0.0
+        self.transfers = {}
+        self.next_transfer_id = 1
+        self._events: queue.Queue[_Event] = queue.Queue()
         self._incoming_handler = IncomingHandler(self)
         self._outgoing_handler = OutgoingHandler(self)
 
     def attach_connection(self, connection: Connection) -> None:
         self._connection = connection
+        if self.network.sasl:
+            self.send_message_with_echo("CAP", ["REQ", "sasl"])
         self.send_message_with_echo("NICK", [self.default_nick])
         self.send_message_with_echo(
             "USER", [self.default_nick, "0", "*", self.default_nick]
         )
 
-    def attach_ui(self, ui: UI) -> None:
+    def attach_ui(self, ui: UI | Daemon) -> None:
         self._ui = ui
 
     def is_channel(self, s: str) -> bool:
-        # TODO: ISUPPORT CHANTYPE
-        return s.startswith(tuple("#!$&"))
+        return s.startswith(tuple(self.isupport.get("CHANTYPES", "#!$&")))
+
+    def get_targmax(self, command: str) -> int | None:
+        """Maximum number of targets of the command, or None if unlimited"""
+        for token in self.isupport.get("TARGMAX", "").split(","):
+            (token_command, _, limit) = token.partition(":")
+            if token_command.upper() == command.upper():
+                return int(limit) if limit.isdigit() else None
+        return None
+
+    def autojoin(self) -> None:
+        if self.autojoined:
+            return
+        self.autojoined = True
+        self.autojoin_pending = {
+            channel.lower() for (channel, _) in self.network.autojoin
+        }
+        # Message.to_bytes truncates longer lines, even if the server allows them
+        linelen = self.isupport.get("LINELEN", "")
+        if linelen.isdigit():
+            max_length = min(int(linelen), MAX_LINE_LENGTH)
+        else:
+            max_length = MAX_LINE_LENGTH
+        for params in pack_joins(
+            self.network.autojoin, max_length, self.get_targmax("JOIN")
+        ):
+            self.send_message_with_echo("JOIN", params, paced=True)
+
+    def loop(self) -> None:
+        while not self.shut_down:
+            try:
+                event = self._events.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            try:
+                self._handle_event(event)
+            except Exception as e:
+                # This is the only thread changing the state, it must not die
+                self.display_error(f"Error while handling {event}: {e!r}")
+
+    def _handle_event(self, event: _Event) -> None:
+        if isinstance(event, IncomingMessage):
+            self._incoming_handler(event.msg)
+        elif isinstance(event, UserInput):
+            self._handle_user_input(event.line)
+        elif isinstance(event, SnapshotRequest):
+            event.callback(self._snapshot())
+        elif isinstance(event, TransferUpdate):
+            self.display_info(f"DCC {event.info}")
+        else:
+            assert False, event
 
     def on_incoming_message(self, msg: Message) -> None:
-        self._incoming_handler(msg)
+        self._events.put(IncomingMessage(msg))
+
+    def on_user_input(self, s: str) -> None:
+        self._events.put(UserInput(s))
+
+    def on_transfer_update(self, transfer: Transfer, info: str) -> None:
+        self._events.put(TransferUpdate(transfer, info))
+
+    def request_snapshot(self, callback: typing.Callable[[StateSnapshot], None]):
+        """Calls ``callback`` from the State thread, with a snapshot of all buffers.
+        Nothing is displayed between the snapshot and the callback."""
+        self._events.put(SnapshotRequest(callback))
+
+    def _snapshot(self) -> StateSnapshot:
+        return StateSnapshot(
+            current_buffer=self.current_buffer,
+            buffers={
+                buf_name: (self.unread[buf_name], buf.snapshot())
+                for (buf_name, buf) in self.messages.items()
+            },
+        )
 
     def display(self, buf_name: str | None, buf_msg: BufferMessage) -> None:
         if buf_name == self.current_buffer:
-            self._ui.display_message(buf_msg)
+            self._ui.display_message(buf_msg, in_buffer=True)
+        elif buf_name is None or buf_name.lower() not in self.autojoin_pending:
+            # our own JOIN, the topic and NAMES of autojoined channels do not
+            # count as unread
+            self.unread[buf_name] += 1
         self.messages[buf_name].append(buf_msg)
 
     def display_info(self, error: str) -> None:
@@ -85,19 +275,34 @@ class State:
         self._ui.display_message(BufferMessage(author=None, content=error, prefix="!"))
 
     def send_message_with_echo(
-        self, command: str, params: list[str], buf_name: str = None
+        self,
+        command: str,
+        params: list[str],
+        buf_name: str = None,
+        *,
+        paced: bool = False,
     ):
         buf_msg = BufferMessage(
             author=None, content=f"{command} {' '.join(params)}", prefix="<--"
         )
-        self._ui.display_message(buf_msg)
+        self._ui.display_message(buf_msg, in_buffer=buf_name == self.current_buffer)
         self.messages[buf_name].append(buf_msg)
-        self.send_message(command, params)
+        if paced:
+            self._connection.send_paced_message(Message(command, params))
+        else:
+            self.send_message(command, params)
 
     def send_message(self, command: str, params: list[str]):
         self._connection.send_message(Message(command, params))
 
-    def on_user_input(self, s: str) -> None:
+    def send_ctcp(self, target: str, content: str) -> None:
+        self.send_message("PRIVMSG", [target, f"\x01{content}\x01"])
+
+    @property
+    def local_address(self) -> str:
+        return self._connection.local_address
+
+    def _handle_user_input(self, s: str) -> None:
         if not s:
             return
         if s.startswith("/"):
@@ -107,10 +312,44 @@ class State:
                 command = s[1:]
                 args = ""
             self._outgoing_handler(command, args)
-        elif self.current_buffer is None:
+        elif self.current_buffer is None or self.current_buffer in self.tables:
             self.display_error("This is not a chat buffer")
         else:
             self._outgoing_handler("PRIVMSG", f"{self.current_buffer} {s}")
 
+    def open_table(self, buf_name: str, columns: tuple[str, ...]) -> None:
+        self.tables[buf_name] = ResultTable(columns)
+        self._table_progress_time = time.monotonic()
+        self.render_table(buf_name)
+        self.switch_to_buffer(buf_name)
+
+    def add_table_row(self, buf_name: str, row: tuple[str, ...]) -> None:
+        table = self.tables[buf_name]
+        table.add_row(row)
+        if len(table.rows) == PAGE_SIZE:
+            # first page is full, no need to wait for the end to show it
+            self.render_table(buf_name)
+        elif buf_name != self.current_buffer:
+            # would be displayed in an unrelated buffer
+            pass
+        elif time.monotonic() - self._table_progress_time >= TABLE_PROGRESS_INTERVAL:
+            self._table_progress_time = time.monotonic()
+            self.display_info(f"{buf_name}: {len(table.rows)} results so far")
+
+    def close_table(self, buf_name: str) -> None:
+        self.tables[buf_name].complete = True
+        self.render_table(buf_name)
+
+    def render_table(self, buf_name: str) -> None:
+        """Replaces the content of the buffer with the current page of its table"""
+        buf = Buffer()
+        for line in self.tables[buf_name].render_page():
+            buf.append(BufferMessage(author=None, content=line))
+        self.messages[buf_name] = buf
+        if buf_name == self.current_buffer:
+            self.switch_to_buffer(buf_name)
+
     def switch_to_buffer(self, buf_name: str | None) -> None:
-        self._ui.switch_to_buffer(buf_name)
+        self.current_buffer = buf_name
+        del self.unread[buf_name]
+        self._ui.switch_to_buffer(buf_name, self.messages[buf_name].snapshot())
@@ -0,0 +1,131 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+from __future__ import annotations
+
+import dataclasses
+import re
+
+PAGE_SIZE = 50
+
+LIST_COLUMNS = ("channel", "users", "topic")
+WHO_COLUMNS = ("nick", "user", "host", "server", "channel", "flags", "realname")
+NAMES_COLUMNS = ("status", "nick")
+
+
+def _sort_key(value: str) -> tuple[int, int, str]:
+    # numbers first, and in numeric order
+    if value.isdigit():
+        return (0, int(value), "")
+    else:
+        return (1, 0, value.lower())
+
+
+@dataclasses.dataclass
+class ResultTable:
+    """Rows of a LIST/WHO/NAMES reply, filled as numerics arrive.
+
+    Filtering, sorting and pagination are done locally; only the current page
+    is ever rendered."""
+
+    columns: tuple[str, ...]
+    rows: list[tuple[str, ...]] = dataclasses.field(default_factory=list)
+    complete: bool = False
+    page: int = 0
+    sort_column: int | None = None
+    sort_reverse: bool = False
+    filters: dict[int, re.Pattern[str]] = dataclasses.field(default_factory=dict)
+    minimums: dict[int, int] = dataclasses.field(default_factory=dict)
+    _view: list[tuple[str, ...]] | None = None
+
+    def column_index(self, name: str) -> int:
+        try:
+            return self.columns.index(name)
+        except ValueError:
+            raise ValueError(
+                f"Unknown column {name!r}, expected one of: {', '.join(self.columns)}"
+            ) from None
+
+    def add_row(self, row: tuple[str, ...]) -> None:
+        assert len(row) == len(self.columns), row
+        self.rows.append(row)
+        self._view = None
+
+    def set_sort(self, column: str, reverse: bool) -> None:
+        self.sort_column = self.column_index(column)
+        self.sort_reverse = reverse
+        self.page = 0
+        self._view = None
+
+    def set_filter(self, column: str, pattern: str) -> None:
+        self.filters[self.column_index(column)] = re.compile(pattern, re.IGNORECASE)
+        self.page = 0
+        self._view = None
+
+    def set_minimum(self, column: str, minimum: int) -> None:
+        self.minimums[self.column_index(column)] = minimum
+        self.page = 0
+        self._view = None
+
+    def reset(self) -> None:
+        self.sort_column = None
+        self.filters.clear()
+        self.minimums.clear()
+        self.page = 0
+        self._view = None
+
+    def view(self) -> list[tuple[str, ...]]:
+        """Rows matching the filters, in order"""
+        if self._view is None:
+            rows: list[tuple[str, ...]] = self.rows
+            if self.filters or self.minimums:
+                rows = [
+                    row
+                    for row in rows
+                    if all(
+                        pattern.search(row[i]) for (i, pattern) in self.filters.items()
+                    )
+                    and all(
+                        row[i].isdigit() and int(row[i]) >= minimum
+                        for (i, minimum) in self.minimums.items()
+                    )
+                ]
+            if self.sort_column is not None:
+                i = self.sort_column
+                rows = sorted(
+                    rows, key=lambda row: _sort_key(row[i]), reverse=self.sort_reverse
+                )
+            self._view = rows
+        return self._view
+
+    def page_count(self) -> int:
+        return max(1, -(-len(self.view()) // PAGE_SIZE))
+
+    def render_page(self) -> list[str]:
+        view = self.view()
+        rows = view[self.page * PAGE_SIZE : (self.page + 1) * PAGE_SIZE]
+        rows = [self.columns, *rows]
+        # pad all columns but the last one
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]) - 1)]
+        lines = [
+            " ".join([*map(str.ljust, row[:-1], widths), row[-1]]) for row in rows
+        ]
+        status = "" if self.complete else ", receiving"
+        lines.append(
+            f"Page {self.page + 1}/{self.page_count()}: {len(view)} of "
+            f"{len(self.rows)} results{status}"
+        )
+        return lines
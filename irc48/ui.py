@@ -32,6 +32,7 @@ import typing
 from . import formatting
 
 if typing.TYPE_CHECKING:
+    from .frontend import Frontend
     from .state import State, BufferMessage
 
 
@@ -42,10 +43,11 @@ class _ControlMessage:
 @dataclasses.dataclass
 class SwitchToBuffer(_ControlMessage):
     buf_name: str | None
+    snapshot: typing.Iterable[BufferMessage]
 
 
 class UI:
-    def __init__(self, state: State):
+    def __init__(self, state: State | Frontend):
         self._state = state
         self._display_queue: queue.Queue[
             BufferMessage | _ControlMessage
@@ -69,10 +71,8 @@ class UI:
             else:
                 if isinstance(msg, SwitchToBuffer):
                     os.system("clear")
-                    buf_name = msg.buf_name
-                    for msg in self._state.messages[buf_name]:
+                    for msg in msg.snapshot:
                         self.print_message(msg)
-                    self._state.current_buffer = buf_name
                 else:
                     assert not isinstance(msg, _ControlMessage)
                     self.print_message(msg)
@@ -87,8 +87,10 @@ class UI:
         else:
             print(f"\r{msg.prefix} {content}")
 
-    def display_message(self, msg: BufferMessage) -> None:
+    def display_message(self, msg: BufferMessage, *, in_buffer: bool = False) -> None:
         self._display_queue.put(msg)
 
-    def switch_to_buffer(self, buf_name: str | None) -> None:
-        self._display_queue.put(SwitchToBuffer(buf_name))
+    def switch_to_buffer(
+        self, buf_name: str | None, snapshot: typing.Iterable[BufferMessage]
+    ) -> None:
+        self._display_queue.put(SwitchToBuffer(buf_name, snapshot))
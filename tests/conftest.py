@@ -0,0 +1,63 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import queue
+
+import pytest
+
+from irc48.config import NetworkConfig
+from irc48.state import State
+
+
+class StubConnection:
+    local_address = "127.0.0.1"
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg):
+        self.sent.append(msg)
+
+    def send_paced_message(self, msg):
+        self.sent.append(msg)
+
+
+class StubUI:
+    def __init__(self):
+        self.displayed = []
+        self.snapshots = queue.Queue()
+
+    def display_message(self, msg, *, in_buffer=False):
+        self.displayed.append(msg)
+
+    def switch_to_buffer(self, buf_name, snapshot):
+        self.snapshots.put((buf_name, snapshot))
+
+
+@pytest.fixture
+def make_state():
+    """Returns a function building a State with a stub UI and connection"""
+
+    def make_state(network=None):
+        state = State(
+            network or NetworkConfig(hostname="irc.example.org", nicks=["me"])
+        )
+        ui = StubUI()
+        state.attach_ui(ui)
+        state.attach_connection(StubConnection())
+        return (state, ui)
+
+    return make_state
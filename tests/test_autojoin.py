@@ -0,0 +1,91 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+from irc48.config import NetworkConfig
+from irc48.message import MAX_LINE_LENGTH, Message, pack_joins
+
+
+def test_pack_joins():
+    channels = [(f"#chan{i}", None) for i in range(10)] + [("#secret", "key")]
+    assert pack_joins(channels, max_targets=4) == [
+        ["#secret,#chan0,#chan1,#chan2", "key"],
+        ["#chan3,#chan4,#chan5,#chan6"],
+        ["#chan7,#chan8,#chan9"],
+    ]
+
+
+def make_autojoin_state(make_state, channels):
+    network = NetworkConfig(
+        hostname="irc.example.org",
+        nicks=["me"],
+        autojoin=[(channel, None) for channel in channels],
+    )
+    return make_state(network)
+
+
+def test_autojoin_linelen(make_state):
+    channels = [f"#channel-number-{i}" for i in range(402)]
+    (state, _) = make_autojoin_state(make_state, channels)
+    handler = state._incoming_handler
+    handler(Message.from_string(":srv 005 me LINELEN=2048 :are supported"))
+    handler(Message.from_string(":srv 376 me :End of /MOTD command."))
+
+    joins = [msg for msg in state._connection.sent if msg.command == "JOIN"]
+    assert all(len(msg.to_bytes()) <= MAX_LINE_LENGTH for msg in joins)
+    assert [
+        channel for msg in joins for channel in msg.params[0].split(",")
+    ] == channels
+
+
+def test_autojoin_invalid_linelen(make_state):
+    (state, _) = make_autojoin_state(make_state, ["#a", "#b"])
+    handler = state._incoming_handler
+    handler(Message.from_string(":srv 005 me LINELEN=lots :are supported"))
+    handler(Message.from_string(":srv 376 me :End of /MOTD command."))
+
+    joins = [msg for msg in state._connection.sent if msg.command == "JOIN"]
+    assert joins == [Message("JOIN", ["#a,#b"])]
+
+
+def test_autojoin_does_not_switch_buffers(make_state):
+    (state, ui) = make_autojoin_state(make_state, ["#a", "#b"])
+    handler = state._incoming_handler
+    handler(Message.from_string(":srv 376 me :End of /MOTD command."))
+    handler(Message.from_string(":me!user@host JOIN #a"))
+    handler(Message.from_string(":srv 366 me #a :End of /NAMES list."))
+    handler(Message.from_string(":srv 474 me #B :Cannot join channel (+b)"))
+    assert ui.snapshots.empty()
+    assert state.autojoin_pending == set()
+
+    # joined manually later
+    handler(Message.from_string(":me!user@host JOIN #b"))
+    assert ui.snapshots.get_nowait()[0] == "#b"
+
+
+def test_autojoin_burst_is_not_unread(make_state):
+    (state, _) = make_autojoin_state(make_state, ["#a", "#b"])
+    handler = state._incoming_handler
+    handler(Message.from_string(":srv 376 me :End of /MOTD command."))
+    for channel in ("#a", "#B"):
+        handler(Message.from_string(f":me!user@host JOIN {channel}"))
+        handler(Message.from_string(f":srv 332 me {channel} :Topic"))
+        handler(Message.from_string(f":srv 333 me {channel} someone 1600000000"))
+        handler(Message.from_string(f":srv 353 me = {channel} :me @op"))
+        handler(Message.from_string(f":srv 366 me {channel} :End of /NAMES list."))
+    assert not +state.unread
+
+    handler(Message.from_string(":nick!user@host PRIVMSG #a :hi"))
+    assert +state.unread == {"#a": 1}
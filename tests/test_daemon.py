@@ -0,0 +1,174 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from irc48.daemon import ATTACH_LINES, SEND_QUEUE_SIZE, Daemon, DaemonError
+from irc48.message import Message
+from irc48.state import BufferMessage
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def privmsg(channel, i):
+    return Message.from_string(f":nick!user@host PRIVMSG {channel} :hi {i}")
+
+
+@pytest.fixture
+def daemon(make_state, tmp_path):
+    (state, _) = make_state()
+    daemon = Daemon(state, str(tmp_path / "irc48.sock"))
+    state.attach_ui(daemon)
+    daemon.start()
+
+    # Some history, before any frontend attaches
+    state.switch_to_buffer("#a")
+    for i in range(10):
+        state.display("#a", BufferMessage(author="nick", content=f"hi {i}"))
+    state.display("#b", BufferMessage(author="nick", content="unread"))
+
+    threads = [threading.Thread(target=state.loop)]
+    threads.append(threading.Thread(target=daemon.loop_accept))
+    for thread in threads:
+        thread.start()
+    yield daemon
+    state.shut_down = True
+    for thread in threads:
+        thread.join()
+
+
+class Frontend:
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.socket.settimeout(10)
+        self.file = self.socket.makefile("rb")
+
+    def send(self, obj):
+        self.socket.sendall(json.dumps(obj).encode() + b"\n")
+
+    def receive(self):
+        return json.loads(self.file.readline())
+
+
+def test_attach_then_live_events(daemon):
+    state = daemon._state
+    frontend = Frontend(daemon._path)
+    # sent while the frontend is attaching; each must be either in the
+    # snapshot or a live event, exactly once
+    for i in range(10, 200):
+        state.on_incoming_message(privmsg("#a", i))
+
+    attach = frontend.receive()
+    assert attach["type"] == "attach"
+    assert attach["current_buffer"] == "#a"
+    buffers = {buf["name"]: buf for buf in attach["buffers"]}
+    assert buffers["#b"]["unread"] == 1
+    assert len(buffers["#a"]["lines"]) <= ATTACH_LINES
+
+    contents = [line[1] for line in buffers["#a"]["lines"]]
+    while not contents or contents[-1] != "hi 199":
+        event = frontend.receive()
+        assert event == {
+            "type": "message",
+            "message": event["message"],
+            "buffer": "#a",
+        }
+        contents.append(event["message"][1])
+    first = int(contents[0].split()[1])
+    assert contents == [f"hi {i}" for i in range(first, 200)]
+
+
+def test_scrollback(daemon):
+    frontend = Frontend(daemon._path)
+    assert frontend.receive()["type"] == "attach"
+
+    frontend.send({"type": "scrollback", "buffer": "#a", "start": 2, "end": 5})
+    assert frontend.receive() == {
+        "type": "scrollback",
+        "buffer": "#a",
+        "start": 2,
+        "lines": [["nick", f"hi {i}", "", False] for i in range(2, 5)],
+    }
+
+
+def test_invalid_requests(daemon):
+    frontend = Frontend(daemon._path)
+    assert frontend.receive()["type"] == "attach"
+
+    frontend.socket.sendall(b"not json\n[]\n")
+    frontend.send({"type": "scrollback", "buffer": "#a"})
+    frontend.send({"type": "scrollback", "buffer": 1, "start": 0, "end": 1})
+    frontend.send({"type": "input"})
+
+    # still attached, and handling requests
+    frontend.send({"type": "input", "line": "/buffers"})
+    event = frontend.receive()
+    assert event["type"] == "message"
+    assert event["message"][1].startswith("Buffer list: ")
+
+
+def test_stuck_frontend_is_dropped(daemon):
+    state = daemon._state
+    frontend = Frontend(daemon._path)  # never reads
+    wait_for(lambda: daemon._clients)
+    (client,) = daemon._clients
+    for i in range(SEND_QUEUE_SIZE * 2):
+        state.on_incoming_message(privmsg("#a", "x" * 400))
+    wait_for(lambda: client.closed)
+
+    # others can still attach
+    assert Frontend(daemon._path).receive()["type"] == "attach"
+    frontend.socket.close()
+
+
+def test_refuses_running_daemon(make_state, daemon):
+    (state, _) = make_state()
+    with pytest.raises(DaemonError, match="already running"):
+        Daemon(state, daemon._path).start()
+    assert Frontend(daemon._path).receive()["type"] == "attach"
+
+
+def test_refuses_other_files(make_state, tmp_path):
+    (state, _) = make_state()
+    path = tmp_path / "notes.txt"
+    path.write_text("important")
+    with pytest.raises(DaemonError, match="not a socket"):
+        Daemon(state, str(path)).start()
+    assert path.read_text() == "important"
+
+
+def test_replaces_stale_socket(make_state, tmp_path):
+    (state, _) = make_state()
+    path = str(tmp_path / "irc48.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # like a daemon that was killed
+
+    daemon = Daemon(state, path)
+    daemon.start()
+    Frontend(path)
+    daemon._socket.close()
@@ -0,0 +1,150 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from irc48 import dcc
+from irc48.config import NetworkConfig
+from irc48.message import Message
+
+SIZE = 50 * 1024 * 1024
+
+
+class LoopbackConnection:
+    """Delivers PRIVMSGs to the State of the other client"""
+
+    local_address = "127.0.0.1"
+
+    def __init__(self, nick, peer_state):
+        self._nick = nick
+        self._peer_state = peer_state
+
+    def send_message(self, msg):
+        if msg.command == "PRIVMSG":
+            self._peer_state.on_incoming_message(
+                Message("PRIVMSG", msg.params, source=f"{self._nick}!user@host")
+            )
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def clients(make_state, tmp_path, monkeypatch):
+    (alice, alice_ui) = make_state(NetworkConfig("irc.example.org", nicks=["alice"]))
+    (bob, bob_ui) = make_state(NetworkConfig("irc.example.org", nicks=["bob"]))
+    alice._connection = LoopbackConnection("alice", bob)
+    bob._connection = LoopbackConnection("bob", alice)
+
+    # bob saves files in the current directory
+    (tmp_path / "bob").mkdir()
+    monkeypatch.chdir(tmp_path / "bob")
+
+    threads = [threading.Thread(target=state.loop) for state in (alice, bob)]
+    for thread in threads:
+        thread.start()
+    yield (alice, bob, bob_ui)
+    alice.shut_down = bob.shut_down = True
+    for thread in threads:
+        thread.join()
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "file.bin"
+    with open(path, "wb") as f:
+        for _ in range(SIZE // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+    return path
+
+
+def accept_offer(alice, bob, source_file):
+    alice.on_user_input(f"/dcc send bob {source_file}")
+    wait_for(lambda: 1 in bob.transfers)
+    bob.on_user_input("/dcc get 1")
+    wait_for(lambda: bob.transfers[1].status == dcc.Status.DONE)
+    wait_for(lambda: alice.transfers[1].status == dcc.Status.DONE)
+    return (alice.transfers[1], bob.transfers[1])
+
+
+def test_send(clients, source_file):
+    (alice, bob, _) = clients
+    (sent, received) = accept_offer(alice, bob, source_file)
+    assert received.transferred == sent.transferred == SIZE
+    assert received.throughput() > 0
+    assert open("file.bin", "rb").read() == source_file.read_bytes()
+
+
+def test_resume(clients, source_file):
+    (alice, bob, _) = clients
+    with open("file.bin.part", "wb") as f:
+        f.write(source_file.read_bytes()[0:1000000])
+    (sent, received) = accept_offer(alice, bob, source_file)
+    assert received.position == sent.position == 1000000
+    assert received.transferred == sent.transferred == SIZE - 1000000
+    assert open("file.bin", "rb").read() == source_file.read_bytes()
+    assert not os.path.exists("file.bin.part")
+
+
+def test_existing_file_is_not_touched(clients, source_file):
+    (alice, bob, bob_ui) = clients
+    with open("file.bin", "wb") as f:
+        f.write(b"not a partial download")
+    alice.on_user_input(f"/dcc send bob {source_file}")
+    wait_for(lambda: 1 in bob.transfers)
+    bob.on_user_input("/dcc get 1")
+    wait_for(lambda: bob_ui.displayed[-1].prefix == "!")
+    assert bob_ui.displayed[-1].content == "DCC: file.bin already exists"
+    assert bob.transfers[1].status == dcc.Status.OFFERED
+    assert open("file.bin", "rb").read() == b"not a partial download"
+
+
+def test_receive_more_than_advertised(clients):
+    (_, bob, bob_ui) = clients
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        port = server.getsockname()[1]
+        bob.on_incoming_message(
+            Message.from_string(
+                f":alice!user@host PRIVMSG bob :\x01DCC SEND file.bin "
+                f"{dcc.format_address('127.0.0.1')} {port} 10\x01"
+            )
+        )
+        wait_for(lambda: 1 in bob.transfers)
+        bob.on_user_input("/dcc get 1")
+        (sock, _) = server.accept()
+        with sock:
+            sock.sendall(b"0123456789abcdefghij")
+            wait_for(lambda: bob.transfers[1].status == dcc.Status.DONE)
+
+    assert open("file.bin", "rb").read() == b"0123456789"
+
+
+def test_cancel(clients, source_file):
+    (alice, bob, _) = clients
+    alice.on_user_input(f"/dcc send bob {source_file}")
+    wait_for(lambda: 1 in alice.transfers)
+    alice.on_user_input("/dcc cancel 1")
+    wait_for(lambda: alice.transfers[1].finished_at is not None)
+    assert alice.transfers[1].status == dcc.Status.CANCELLED
@@ -0,0 +1,118 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import queue
+import threading
+import time
+
+from irc48.message import Message
+from irc48.state import BUFFER_SIZE, BufferMessage
+
+
+def check_snapshot(snapshot):
+    previous_seq = None
+    previous_number = None
+    for (seq, msg) in snapshot.items(snapshot.start, snapshot.end):
+        assert snapshot.start <= seq < snapshot.end
+        assert previous_seq is None or seq > previous_seq
+        # messages are numbered in the order they were sent to each channel
+        number = int(msg.content.split()[-1])
+        assert previous_number is None or number > previous_number
+        (previous_seq, previous_number) = (seq, number)
+
+
+def test_switch_during_flood(make_state):
+    (state, ui) = make_state()
+    channels = ["#a", "#b", "#c"]
+    errors = []
+
+    def read_snapshots():
+        while not state.shut_down or not ui.snapshots.empty():
+            try:
+                (buf_name, snapshot) = ui.snapshots.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            try:
+                check_snapshot(snapshot)
+                # the writer keeps overwriting the ring, re-check the view
+                check_snapshot(state.messages[buf_name].snapshot())
+            except AssertionError as e:
+                errors.append(e)
+
+    state_thread = threading.Thread(target=state.loop)
+    reader_thread = threading.Thread(target=read_snapshots)
+    state_thread.start()
+    reader_thread.start()
+    try:
+        for i in range(20000):
+            channel = channels[i % len(channels)]
+            state.on_incoming_message(
+                Message.from_string(f":nick!user@host PRIVMSG {channel} :hi {i}")
+            )
+            if i % 50 == 0:
+                state.on_user_input(f"/buf {channels[(i // 50) % len(channels)]}")
+        deadline = time.monotonic() + 30
+        while not state._events.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        state.shut_down = True
+        state_thread.join()
+        reader_thread.join()
+
+    assert not errors, errors[0]
+    for channel in channels:
+        buf = state.messages[channel]
+        assert len(buf) == BUFFER_SIZE
+        check_snapshot(buf.snapshot())
+
+
+def test_snapshot_skips_overwritten_slots(make_state):
+    (state, _) = make_state()
+    for i in range(BUFFER_SIZE):
+        state.display("#a", BufferMessage(author="nick", content=f"hi {i}"))
+    snapshot = state.messages["#a"].snapshot()
+    for i in range(BUFFER_SIZE, BUFFER_SIZE + 10):
+        state.display("#a", BufferMessage(author="nick", content=f"hi {i}"))
+
+    contents = [msg.content for msg in snapshot]
+    assert contents == [f"hi {i}" for i in range(10, BUFFER_SIZE)]
+    check_snapshot(snapshot)
+
+
+def test_loop_survives_handler_error(make_state):
+    (state, ui) = make_state()
+
+    def onFoo(msg):
+        raise RuntimeError("oops")
+
+    state._incoming_handler.onFoo = onFoo
+    state_thread = threading.Thread(target=state.loop)
+    state_thread.start()
+    try:
+        state.on_incoming_message(Message.from_string(":srv FOO bar"))
+        state.on_user_input("/msg foo")
+        state.on_incoming_message(Message.from_string("PING :token"))
+        deadline = time.monotonic() + 5
+        while Message("PONG", ["token"]) not in state._connection.sent:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        state.shut_down = True
+        state_thread.join()
+
+    errors = [msg.content for msg in ui.displayed if msg.prefix == "!"]
+    assert "RuntimeError('oops')" in errors[0]
+    assert errors[1] == "Syntax: /PRIVMSG <target> <message>"
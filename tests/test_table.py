@@ -0,0 +1,95 @@
+##
+# Copyright (C) 2022  Valentin Lorentz
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+from irc48.message import Message
+from irc48.table import PAGE_SIZE, ResultTable
+
+
+def test_sort_filter_and_page():
+    table = ResultTable(("channel", "users", "topic"))
+    for i in range(120):
+        table.add_row((f"#c{i}", str(i % 60), f"topic {i}"))
+    table.set_minimum("users", 10)
+    table.set_sort("users", reverse=True)
+    assert len(table.view()) == 100
+    assert table.view()[0][1] == "59"
+    assert table.page_count() == 2
+    table.page = 1
+    lines = table.render_page()
+    assert len(lines) == 1 + (100 - PAGE_SIZE) + 1
+    assert lines[-1] == "Page 2/2: 100 of 120 results, receiving"
+
+    table.set_filter("topic", "^topic 1.$")
+    assert [row[0] for row in table.view()] == [f"#c{i}" for i in range(19, 9, -1)]
+
+
+def test_list(make_state):
+    (state, _) = make_state()
+    state._handle_user_input("/list >10")
+    state._incoming_handler(Message.from_string(":srv 322 me #a 12 :first"))
+    state._incoming_handler(Message.from_string(":srv 322 me #b 11 :second"))
+    # nonstandard reply, passed through instead of failing
+    state._incoming_handler(Message.from_string(":srv 322 me #c 11"))
+    state._incoming_handler(Message.from_string(":srv 323 me :End of /LIST"))
+    table = state.tables["*list"]
+    assert table.complete
+    assert table.rows == [("#a", "12", "first"), ("#b", "11", "second")]
+
+
+def test_names_case(make_state):
+    (state, _) = make_state()
+    state._handle_user_input("/names #Foo")
+    state._incoming_handler(Message.from_string(":srv 353 me = #foo :@a +b c"))
+    state._incoming_handler(Message.from_string(":srv 366 me #foo :End"))
+    table = state.tables["*names #foo"]
+    assert table.complete
+    assert table.rows == [("@", "a"), ("+", "b"), ("", "c")]
+
+
+def test_who_error(make_state):
+    (state, _) = make_state()
+    handler = state._incoming_handler
+    state._handle_user_input("/who alice")
+    handler(Message.from_string(":srv 263 me WHO :Server load is too heavy"))
+    state._handle_user_input("/who bob")
+    handler(Message.from_string(":srv 352 me * u h s bob H :0 Bob"))
+    handler(Message.from_string(":srv 315 me bob :End of /WHO list."))
+
+    assert state.tables["*who alice"].complete
+    assert state.tables["*who alice"].rows == []
+    assert state.tables["*who bob"].complete
+    assert state.tables["*who bob"].rows == [("bob", "u", "h", "s", "*", "H", "Bob")]
+    assert not state.pending_who
+
+
+def test_list_error(make_state):
+    (state, _) = make_state()
+    state._handle_user_input("/list")
+    state._incoming_handler(Message.from_string(":srv 481 me :Permission Denied"))
+    assert state.tables["*list"].complete
+
+
+def test_progress_only_in_table_buffer(make_state, monkeypatch):
+    monkeypatch.setattr("irc48.state.TABLE_PROGRESS_INTERVAL", 0)
+    (state, ui) = make_state()
+    state._handle_user_input("/list")
+    state._incoming_handler(Message.from_string(":srv 322 me #a 1 :topic"))
+    assert ui.displayed[-1].content == "*list: 1 results so far"
+
+    state._handle_user_input("/buf #chat")
+    ui.displayed.clear()
+    state._incoming_handler(Message.from_string(":srv 322 me #b 1 :topic"))
+    assert ui.displayed == []